@@ -1,7 +1,14 @@
-import os, json, sys, time
-from decimal import Decimal, ROUND_DOWN
+import os, json, sys, time, uuid, queue, random, asyncio, logging, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+from datetime import datetime
+from decimal import Decimal, ROUND_CEILING, ROUND_DOWN
+from typing import NamedTuple
 
 import gspread
+import requests
+import websockets
+from requests.adapters import HTTPAdapter
 from google.oauth2 import service_account
 from alpaca_trade_api import REST
 from alpaca_trade_api.rest import APIError
@@ -11,40 +18,140 @@ from alpaca_trade_api.rest import APIError
 SHEET_NAME = os.getenv("SHEET_NAME", "Active-Investing")
 WORKSHEET_NAME = os.getenv("WORKSHEET_NAME", "Alpaca Integration")
 SHEET_ID = os.getenv("SHEET_ID")
+TICKER_RANGE = "A2:A"  # ticker rows below the header; Sheets drops trailing blank rows
 
-ALPACA_API_KEY = (os.getenv("ALPACA_API_KEY") or "").strip()
-ALPACA_SECRET_KEY = (os.getenv("ALPACA_SECRET_KEY") or "").strip()
-ALPACA_BASE_URL = (os.getenv("ALPACA_BASE_URL", "https://paper-api.alpaca.markets") or "").strip()
+
+class AlpacaConfig(NamedTuple):
+    api_key: str
+    secret_key: str
+    base_url: str
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            api_key=(os.getenv("ALPACA_API_KEY") or "").strip(),
+            secret_key=(os.getenv("ALPACA_SECRET_KEY") or "").strip(),
+            base_url=(os.getenv("ALPACA_BASE_URL", "https://paper-api.alpaca.markets") or "").strip(),
+        )
+
+
+ALPACA = AlpacaConfig.from_env()  # read once at import; every Alpaca client is built from this
 
 GOOGLE_CREDS_JSON = os.getenv("GOOGLE_CREDS_JSON")
+GOOGLE_TOKEN_CACHE = os.getenv("GOOGLE_TOKEN_CACHE", "")  # opt-in path for reusing the access token
 
 BUY_FRACTION = Decimal("0.07")  # 7% of buying power per ticker
 MIN_NOTIONAL = Decimal(os.getenv("MIN_NOTIONAL", "1"))  # $1 min trade size
+# the order math runs in integer cents; Decimal is only used to parse inputs
+BUY_FRACTION_BPS = int(BUY_FRACTION * 10_000)
+MIN_NOTIONAL_CENTS = int((MIN_NOTIONAL * 100).to_integral_value(rounding=ROUND_CEILING))  # rounded up
+MAX_CONCURRENT_ORDERS = 8  # in-flight Alpaca orders
+ORDER_RATE = 3.0  # order submits per second, under Alpaca's 200 req/min
+ORDER_BURST = 5
+FILL_TIMEOUT = 10  # seconds to wait for a buy to fill before logging N/A
+STREAM_CONNECT_TIMEOUT = 5  # seconds to wait for trade_updates before falling back to polling
+RATE_LIMIT_MAX_WAIT = 30  # seconds; longest sleep between order retries, including on a 429
+FINAL_ORDER_EVENTS = frozenset({"fill", "canceled", "rejected", "expired", "done_for_day"})
+
+
+log = logging.getLogger(__name__)
 
 
 # --- HELPERS ---
+def setup_logging():
+    # records are queued by the caller and written by a background thread, so order
+    # workers never block on a slow stdout/stderr pipe; info -> stdout, warnings -> stderr
+    out = logging.StreamHandler(sys.stdout)
+    out.addFilter(lambda r: r.levelno < logging.WARNING)
+    err = logging.StreamHandler(sys.stderr)
+    err.setLevel(logging.WARNING)
+
+    q = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(QueueHandler(q))
+    listener = QueueListener(q, out, err, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
 def die(msg, code=1):
-    print(msg, file=sys.stderr)
+    log.error(msg)
     sys.exit(code)
 
 
-def validate_alpaca_env():
-    if not ALPACA_API_KEY or not ALPACA_SECRET_KEY:
+def validate_alpaca_env(cfg):
+    if not cfg.api_key or not cfg.secret_key:
         die("Missing ALPACA_API_KEY or ALPACA_SECRET_KEY.")
-    if not ALPACA_BASE_URL.startswith("https://"):
-        die(f"ALPACA_BASE_URL looks wrong: '{ALPACA_BASE_URL}'")
+    if not cfg.base_url.startswith("https://"):
+        die(f"ALPACA_BASE_URL looks wrong: '{cfg.base_url}'")
 
-    prefix = ALPACA_API_KEY[:2].upper()
-    if "paper-api.alpaca.markets" in ALPACA_BASE_URL and prefix != "PK":
-        print(f"⚠️  Warning: Key prefix '{prefix}' may not match paper API.", file=sys.stderr)
-    if "api.alpaca.markets" in ALPACA_BASE_URL and prefix != "AK":
-        print(f"⚠️  Warning: Key prefix '{prefix}' may not match live API.", file=sys.stderr)
+    prefix = cfg.api_key[:2].upper()
+    if "paper-api.alpaca.markets" in cfg.base_url and prefix != "PK":
+        log.warning(f"⚠️  Warning: Key prefix '{prefix}' may not match paper API.")
+    if "api.alpaca.markets" in cfg.base_url and prefix != "AK":
+        log.warning(f"⚠️  Warning: Key prefix '{prefix}' may not match live API.")
 
 
-def get_alpaca():
-    validate_alpaca_env()
-    print(f"✅ Connecting to Alpaca @ {ALPACA_BASE_URL} using key …{ALPACA_API_KEY[-4:]}")
-    return REST(ALPACA_API_KEY, ALPACA_SECRET_KEY, base_url=ALPACA_BASE_URL, api_version="v2")
+def get_alpaca(cfg):
+    validate_alpaca_env(cfg)
+    log.info(f"✅ Connecting to Alpaca @ {cfg.base_url} using key …{cfg.api_key[-4:]}")
+    api = REST(cfg.api_key, cfg.secret_key, base_url=cfg.base_url, api_version="v2")
+    # one keep-alive connection per order worker, so concurrent orders reuse warm TLS
+    # sessions instead of opening new ones once the default pool is exhausted
+    api._session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=MAX_CONCURRENT_ORDERS))
+    return api
+
+
+def get_order_client(cfg, api):
+    # order submits get their own client with the SDK's 429/504 retry off, so that
+    # submit_order_with_retry is their one retry layer: a blind SDK re-POST of an order
+    # that landed would come back as a duplicate-id 422. Reads keep the SDK retry.
+    orders = REST(cfg.api_key, cfg.secret_key, base_url=cfg.base_url, api_version="v2")
+    orders._retry = 0
+    orders._session = api._session  # same keep-alive pool as api
+    return orders
+
+
+class CachedTokenCredentials(service_account.Credentials):
+    """Service-account credentials that reuse an unexpired access token across runs."""
+
+    def _cache_key(self):
+        return f"{self.service_account_email}|{' '.join(sorted(self.scopes or ()))}"
+
+    def load_cached_token(self):
+        if not GOOGLE_TOKEN_CACHE:
+            return self
+        try:
+            with os.fdopen(os.open(GOOGLE_TOKEN_CACHE, os.O_RDONLY | os.O_NOFOLLOW)) as f:
+                cached = json.load(f)
+            if cached["key"] == self._cache_key():
+                # google-auth refreshes on its own if this is already (nearly) expired
+                self.token = cached["token"]
+                self.expiry = datetime.fromisoformat(cached["expiry"])
+        except Exception:
+            pass  # no usable cache; the first request signs a fresh JWT as usual
+        return self
+
+    def refresh(self, request):
+        super().refresh(request)
+        if not GOOGLE_TOKEN_CACHE:
+            return
+        # mkstemp creates a fresh 0600 file (O_EXCL | O_NOFOLLOW); os.replace then swaps it
+        # in atomically, replacing rather than following anything already at the path
+        tmp = None
+        try:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(GOOGLE_TOKEN_CACHE)))
+            with os.fdopen(fd, "w") as f:
+                json.dump({"key": self._cache_key(), "token": self.token, "expiry": self.expiry.isoformat()}, f)
+            os.replace(tmp, GOOGLE_TOKEN_CACHE)
+        except OSError as e:
+            log.warning(f"⚠️  Could not cache Google access token: {e}")
+            if tmp:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
 
 
 def get_gspread_client():
@@ -55,125 +162,392 @@ def get_gspread_client():
     except Exception as e:
         die(f"GOOGLE_CREDS_JSON is not valid JSON: {e}")
 
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive.readonly",
-    ]
-    creds = service_account.Credentials.from_service_account_info(info, scopes=scopes)
-    return gspread.authorize(creds)
-
-
-def decimal_usd(x) -> Decimal:
-    return Decimal(str(x)).quantize(Decimal("0.01"), rounding=ROUND_DOWN)
-
+    # opening by key needs only the Sheets scope; title lookup goes through Drive
+    scopes = ["https://www.googleapis.com/auth/spreadsheets"]
+    if not SHEET_ID:
+        scopes.append("https://www.googleapis.com/auth/drive.readonly")
+    creds = CachedTokenCredentials.from_service_account_info(info, scopes=scopes)
+    return gspread.authorize(creds.load_cached_token())
 
-def first_empty_row(ws, col: int, start_row: int = 2) -> int:
-    vals = ws.col_values(col)
-    return max(start_row, len(vals) + 1)
-
-
-# --- MAIN LOGIC ---
-def main():
-    gc = get_gspread_client()
 
-    # open the spreadsheet
+def open_worksheet(gc):
     try:
         if SHEET_ID:
             sh = gc.open_by_key(SHEET_ID)
         else:
             sh = gc.open(SHEET_NAME)
-        ws = sh.worksheet(WORKSHEET_NAME)
+        return sh.worksheet(WORKSHEET_NAME)
     except Exception as e:
         die(f"❌ Failed to open Google Sheet: {e}")
 
-    api = get_alpaca()
+
+def usd_cents(x) -> int:
+    # whole cents, rounded down; parsed via str so floats don't carry binary noise
+    return int(Decimal(str(x)).scaleb(2).to_integral_value(rounding=ROUND_DOWN))
+
+
+def fmt_usd(cents: int) -> str:
+    sign = "-" if cents < 0 else ""
+    dollars, rem = divmod(abs(cents), 100)
+    return f"{sign}{dollars}.{rem:02d}"
+
+
+class TradeUpdates:
+    """Listens on Alpaca's trade_updates stream so fills are pushed instead of polled."""
+
+    def __init__(self, cfg):
+        self.url = cfg.base_url.replace("https://", "wss://", 1).rstrip("/") + "/stream"
+        self.key, self.secret = cfg.api_key, cfg.secret_key
+        self.ready = threading.Event()  # set while authenticated and listening
+        self.failed = threading.Event()  # set if auth was rejected; the stream won't come up
+        self.generation = 0  # bumped on every (re)connect; a change means events may have been missed
+        self._stop = threading.Event()  # set once the caller gave up waiting and went to polling
+        self._cond = threading.Condition()
+        self._expected = set()  # client_order_ids someone will wait on
+        self._outcomes = {}  # client_order_id -> final trade_updates event
+
+    def start(self):
+        threading.Thread(target=asyncio.run, args=(self._run(),), daemon=True).start()
+        return self
+
+    def wait_connected(self, timeout):
+        """Block until the stream is listening or has given up; returns whether it's listening."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.ready.is_set() or self.failed.is_set(), timeout)
+            if not self.ready.is_set():
+                self._stop.set()  # nobody will use it now; don't keep reconnecting
+        return self.ready.is_set()
+
+    def expect(self, client_order_id):
+        # register before submitting so a fast fill can't beat the listener
+        with self._cond:
+            self._expected.add(client_order_id)
+
+    def wait_all(self, client_order_ids, timeout, generation):
+        """Block until every order fills or dies, the stream drops, or `timeout` passes.
+
+        Returns ({client_order_id: final event or None}, intact), where intact is False if
+        the connection seen as `generation` didn't stay up: missing events may be lost fills.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            def intact():
+                return self.ready.is_set() and self.generation == generation
+
+            while intact() and not all(c in self._outcomes for c in client_order_ids):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return {c: self._outcomes.get(c) for c in client_order_ids}, intact()
+
+    def forget(self, client_order_ids):
+        with self._cond:
+            for c in client_order_ids:
+                self._expected.discard(c)
+                self._outcomes.pop(c, None)
+
+    async def _run(self):
+        failures = 0  # connect attempts in a row that never got to listening
+        while not self._stop.is_set():
+            connected = False
+            try:
+                async with websockets.connect(self.url) as ws:
+                    await ws.send(json.dumps({
+                        "action": "authenticate",
+                        "data": {"key_id": self.key, "secret_key": self.secret},
+                    }))
+                    auth = json.loads(await ws.recv())
+                    if (auth.get("data") or {}).get("status") != "authorized":
+                        log.warning(f"⚠️  trade_updates auth failed: {auth}")
+                        with self._cond:
+                            self.failed.set()
+                            self._cond.notify_all()
+                        return
+                    await ws.send(json.dumps({"action": "listen", "data": {"streams": ["trade_updates"]}}))
+                    await ws.recv()  # listening ack
+                    with self._cond:
+                        self.generation += 1
+                        self.ready.set()
+                        self._cond.notify_all()
+                    connected, failures = True, 0
+                    async for raw in ws:
+                        self._dispatch(json.loads(raw))
+            except Exception as e:
+                if connected:
+                    log.warning(f"⚠️  trade_updates stream dropped ({e}); reconnecting.")
+                else:
+                    failures += 1
+                    # only the first failure in a row is worth a warning
+                    log.log(logging.WARNING if failures == 1 else logging.DEBUG,
+                            f"⚠️  trade_updates connect failed ({e}); retrying.")
+            with self._cond:
+                self.ready.clear()
+                self._cond.notify_all()  # wake waiters: their events may now be lost
+            await asyncio.sleep(min(30, 2 ** failures))  # 1s after a drop, backing off while down
+
+    def _dispatch(self, msg):
+        if msg.get("stream") != "trade_updates":
+            return
+        data = msg.get("data") or {}
+        event = data.get("event")
+        if event not in FINAL_ORDER_EVENTS:
+            return
+        client_order_id = (data.get("order") or {}).get("client_order_id")
+        with self._cond:
+            if client_order_id in self._expected:
+                self._outcomes[client_order_id] = event
+                self._cond.notify_all()
+
+
+class TokenBucket:
+    """Thread-safe token bucket: refills `rate` tokens per second, banks up to `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate, self.burst = rate, burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+order_bucket = TokenBucket(ORDER_RATE, ORDER_BURST)
+
+
+def backoff_delay(attempt, base=0.1, cap=4.0):
+    # exponential backoff with full jitter: early retries are fast, and workers that
+    # failed together don't retry in lockstep
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def fetch_avg_entry_prices(api, symbols, timeout):
+    # one list_positions() snapshot covers every symbol; it is only re-fetched while
+    # some bought symbol's position hasn't shown up yet
+    deadline = time.monotonic() + timeout
+    pending, prices = set(symbols), {}
+    attempt = 0
+    while pending:
+        try:
+            for pos in api.list_positions():
+                if pos.symbol in pending:
+                    prices[pos.symbol] = pos.avg_entry_price
+        except Exception as e:
+            log.warning(f"⚠️  list_positions failed: {e}")
+        pending -= prices.keys()
+        remaining = deadline - time.monotonic()
+        if not pending or remaining <= 0:
+            break
+        time.sleep(min(backoff_delay(attempt), remaining))
+        attempt += 1
+    return prices
+
+
+def http_status(e):
+    if isinstance(e, APIError):
+        return e.status_code
+    return e.response.status_code if e.response is not None else None
+
+
+def retry_after(e):
+    # seconds until the rate-limit window resets, from the 429 response headers
+    response = getattr(e, "response", None)
+    headers = response.headers if response is not None else {}
+    try:
+        if "Retry-After" in headers:
+            return float(headers["Retry-After"])
+        if "X-RateLimit-Reset" in headers:  # epoch seconds
+            return float(headers["X-RateLimit-Reset"]) - time.time()
+    except ValueError:
+        pass
+    return None
+
+
+def retry_delay(e, attempt):
+    # a 429 says when the window resets: wait that long, plus jitter so the workers
+    # that were limited together don't all come back in the same instant
+    if http_status(e) == 429 and (wait := retry_after(e)) is not None:
+        return min(RATE_LIMIT_MAX_WAIT, max(0.0, wait)) + random.uniform(0, 0.5)
+    # otherwise exponential backoff in seconds with equal jitter (at least half the step)
+    step = min(RATE_LIMIT_MAX_WAIT, 2.0 * 2 ** attempt)
+    return step / 2 + random.uniform(0, step / 2)
+
+
+def find_order(api, client_order_id):
+    # None only when Alpaca has no such order; any other failure means "don't know"
+    try:
+        return api.get_order_by_client_order_id(client_order_id)
+    except (APIError, requests.HTTPError) as e:
+        if http_status(e) == 404:
+            return None
+        raise
+
+
+def submit_order_with_retry(api, orders, client_order_id, attempts=4, **order):
+    # retries rate limits, server errors and lost connections; client_order_id lets a
+    # retry find an order that landed even though its response was lost. Lookups go
+    # through api (SDK retries on); the submit itself through orders (SDK retries off).
+    for attempt in range(attempts):
+        try:
+            # a failed lookup is retried like a failed submit, never answered by resubmitting
+            if attempt and (existing := find_order(api, client_order_id)):
+                return existing
+            order_bucket.acquire()
+            return orders.submit_order(client_order_id=client_order_id, **order)
+        except (APIError, requests.RequestException) as e:
+            status = http_status(e)
+            if status == 422 and "client_order_id" in str(e):
+                # an earlier attempt did land; report that order rather than an error
+                if existing := find_order(api, client_order_id):
+                    return existing
+                raise
+            retryable = (
+                status == 429
+                or (status or 0) >= 500
+                or isinstance(e, (requests.ConnectionError, requests.Timeout))
+            )
+            if attempt == attempts - 1 or not retryable:
+                raise
+            time.sleep(retry_delay(e, attempt))
+
+
+def submit_buy(api, orders, updates, ticker, notional_cents):
+    """Submit one buy; returns (log row, client_order_id or None if nothing was placed)."""
+    notional = fmt_usd(notional_cents)
+    if notional_cents < MIN_NOTIONAL_CENTS:
+        log.info(f"Skipping {ticker} — notional ${notional} < ${MIN_NOTIONAL}")
+        return [ticker, f"SKIPPED (notional ${notional})"], None
+
+    client_order_id = uuid.uuid4().hex
+    updates.expect(client_order_id)
+    try:
+        order = submit_order_with_retry(
+            api, orders, client_order_id,
+            symbol=ticker, side="buy", type="market", time_in_force="day", notional=notional_cents / 100,
+        )
+    except Exception as e:
+        updates.forget([client_order_id])
+        err = f"ERROR: {e}"
+        log.error(f"{ticker}: {err}")
+        return [ticker, err], None
+    log.info(f"✅ Submitted BUY {ticker} for ${notional} (Order ID: {order.id})")
+    # avg_entry_price is filled in from one positions snapshot once fills are known
+    return [ticker, None], client_order_id
+
+
+def place_buys(api, orders, updates, plan):
+    generation = updates.generation  # events are only trusted from this connection on
+    # submit everything first: each order is HTTPS-bound, so threads overlap the
+    # round-trips and the pool size caps how many are in flight. map() keeps sheet order.
+    with ThreadPoolExecutor(MAX_CONCURRENT_ORDERS) as ex:
+        submitted = list(ex.map(lambda p: submit_buy(api, orders, updates, *p), plan))
+    placed = {coid: row for row, coid in submitted if coid}
+
+    # then wait for all fills under one shared deadline
+    if placed and updates.ready.is_set():
+        outcomes, stream_up = updates.wait_all(list(placed), FILL_TIMEOUT, generation)
+        for coid, row in placed.items():
+            outcome = outcomes[coid]
+            if outcome and outcome != "fill":
+                log.warning(f"⚠️  {row[0]} order {outcome} before filling")
+                row[1] = f"N/A ({outcome})"
+            elif outcome is None and stream_up:
+                # stream stayed up, so a timeout means the order really hasn't filled
+                log.info(f"⚠️  Could not fetch avg_entry_price for {row[0]}")
+                row[1] = "N/A"
+            # otherwise filled, or the stream dropped or reconnected: the positions snapshot has to tell
+    updates.forget(placed)
+    return [row for row, _ in submitted]
+
+
+# --- MAIN LOGIC ---
+def main():
+    gc = get_gspread_client()
+    ws = open_worksheet(gc)  # opened once; every sheet call below reuses this handle
+
+    api = get_alpaca(ALPACA)
     try:
         account = api.get_account()
-        buying_power = decimal_usd(account.buying_power)
-        print(f"💰 Current buying power: ${buying_power}")
+        buying_power_cents = usd_cents(account.buying_power)
+        log.info(f"💰 Current buying power: ${fmt_usd(buying_power_cents)}")
     except APIError as e:
         die(f"❌ Alpaca auth failed: {e}. Check keys and ALPACA_BASE_URL.")
+    orders = get_order_client(ALPACA, api)
 
-    # read tickers from column A
-    col_a = ws.col_values(1)
+    # connect to trade_updates now so it is listening by the time orders go out
+    updates = TradeUpdates(ALPACA).start()
+
+    # read tickers from column A, below the header, plus the log column to find its next open row
+    col_a, col_c = ws.batch_get([TICKER_RANGE, "C:C"])
     if not col_a:
-        print("No data found in column A; nothing to do.")
+        log.info("No data found in column A; nothing to do.")
         return
 
-    start_row = 2
-    max_row = len(col_a)
-    tickers_to_process = []
-    for idx in range(start_row - 1, max_row):
-        t = (col_a[idx] or "").strip()
-        if t:
-            tickers_to_process.append((idx + 1, t.upper()))
+    # normalize, drop blanks, and dedupe (keeping sheet order) so a repeated symbol isn't bought twice
+    tickers_to_process = list(dict.fromkeys(t for row in col_a if row and (t := row[0].strip().upper())))
 
     if not tickers_to_process:
-        print("No tickers listed below the header; nothing to do.")
+        log.info("No tickers listed below the header; nothing to do.")
         return
 
-    print(f"📈 Found {len(tickers_to_process)} ticker(s): {[t for _, t in tickers_to_process]}")
-
-    log_rows = []  # [[ticker, avg_entry_price]]
-
-    for _, ticker in tickers_to_process:
-        try:
-            account = api.get_account()
-            buying_power = decimal_usd(account.buying_power)
-            notional = (buying_power * BUY_FRACTION).quantize(Decimal("0.01"), rounding=ROUND_DOWN)
-
-            if notional < MIN_NOTIONAL:
-                print(f"Skipping {ticker} — notional ${notional} < ${MIN_NOTIONAL}")
-                log_rows.append([ticker, f"SKIPPED (notional ${notional})"])
-                continue
-
-            order = api.submit_order(
-                symbol=ticker, side="buy", type="market", time_in_force="day", notional=float(notional)
-            )
-            print(f"✅ Submitted BUY {ticker} for ${notional} (Order ID: {order.id})")
-
-            # Wait for fill and fetch avg_entry_price
-            avg_entry_price = None
-            for attempt in range(10):  # retry up to ~10 seconds
-                try:
-                    pos = api.get_position(ticker)
-                    avg_entry_price = pos.avg_entry_price
-                    break
-                except Exception:
-                    time.sleep(1)
-
-            if avg_entry_price:
-                print(f"📊 {ticker} avg_entry_price: ${avg_entry_price}")
-                log_rows.append([ticker, avg_entry_price])
+    log.info(f"📈 Found {len(tickers_to_process)} ticker(s): {tickers_to_process}")
+
+    # split buying power up front so every order can be in flight at once: each ticker gets
+    # 7% of what the earlier tickers' planned notionals left over. A planned notional stays
+    # reserved even if its order is later rejected, so a failed ticker still shrinks the
+    # allocations after it (submission no longer waits on each result to re-read the account).
+    plan = []
+    for ticker in tickers_to_process:
+        notional_cents = buying_power_cents * BUY_FRACTION_BPS // 10_000
+        if notional_cents >= MIN_NOTIONAL_CENTS:
+            buying_power_cents -= notional_cents
+        plan.append((ticker, notional_cents))
+
+    if not updates.wait_connected(STREAM_CONNECT_TIMEOUT):
+        log.warning("⚠️  trade_updates stream not connected; polling positions for fills.")
+    log_rows = place_buys(api, orders, updates, plan)  # [[ticker, avg_entry_price]]
+
+    bought = [row for row in log_rows if row[1] is None]
+    if bought:
+        prices = fetch_avg_entry_prices(api, [t for t, _ in bought], FILL_TIMEOUT)
+        for row in bought:
+            ticker = row[0]
+            if ticker in prices:
+                row[1] = prices[ticker]
+                log.info(f"📊 {ticker} avg_entry_price: ${row[1]}")
             else:
-                print(f"⚠️  Could not fetch avg_entry_price for {ticker}")
-                log_rows.append([ticker, "N/A"])
-
-        except Exception as e:
-            err = f"ERROR: {e}"
-            print(f"{ticker}: {err}", file=sys.stderr)
-            log_rows.append([ticker, err])
-
-        time.sleep(0.4)
-
-    # write logs to next open rows in C:D
-    if log_rows:
-        first_row = first_empty_row(ws, col=3, start_row=2)
-        last_row = first_row + len(log_rows) - 1
-        ws.update(f"C{first_row}:D{last_row}", log_rows, value_input_option="RAW")
-        print(f"📝 Logged {len(log_rows)} rows with avg_entry_price to C{first_row}:D{last_row}")
-
-    # clear all of column A
-    try:
-        ws.batch_clear(["A:A"])
-        print("🧹 Cleared entire column A.")
-    except Exception as e:
-        print(f"batch_clear failed ({e}); trying fallback.")
-        rows = len(ws.get_all_values()) or 1000
-        blanks = [[""] for _ in range(rows)]
-        ws.update(f"A1:A{rows}", blanks)
-        print("🧹 Cleared entire column A via fallback.")
+                row[1] = "N/A"
+                log.info(f"⚠️  Could not fetch avg_entry_price for {ticker}")
+
+    # write logs to next open rows in C:D and clear the header plus the ticker rows that
+    # were read, in one batchUpdate; rows added below them since the read are left alone
+    first_row = max(2, len(col_c) + 1)
+    last_row = first_row + len(log_rows) - 1
+    last_ticker_row = len(col_a) + 1
+    ws.batch_update(
+        [
+            {"range": f"C{first_row}:D{last_row}", "values": log_rows},
+            {"range": f"A1:A{last_ticker_row}", "values": [[""]] * last_ticker_row},
+        ],
+        value_input_option="RAW",
+    )
+    log.info(f"📝 Logged {len(log_rows)} rows with avg_entry_price to C{first_row}:D{last_row}")
+    log.info(f"🧹 Cleared A1:A{last_ticker_row}.")
 
 
 if __name__ == "__main__":
-    main()
+    listener = setup_logging()
+    try:
+        main()
+    finally:
+        listener.stop()